@@ -0,0 +1,309 @@
+"""Decoding, feature extraction and rule-based classification for uploaded audio.
+
+Kept free of torch, onnxruntime, transformers and the web stack so the
+analysis pool workers in server.py only import what the request path needs.
+"""
+import io
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, Any
+
+import librosa
+import numpy as np
+import scipy.fft
+try:
+    import pyfftw
+except ImportError:  # fall back to scipy's pocketfft
+    pyfftw = None
+from pydub import AudioSegment
+import soundfile as sf
+
+# Fixed analysis layout: every upload is resampled to 16kHz
+SAMPLE_RATE = 16000
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+FFT_BLOCK_FRAMES = 64  # ~2s of frames per FFTW call
+
+# Spectral constants for that layout, built once at import
+_WINDOW = librosa.filters.get_window("hann", N_FFT).astype(np.float32)
+_FREQS = np.fft.rfftfreq(N_FFT, d=1.0 / SAMPLE_RATE).astype(np.float32)
+_MEL_FB = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT).astype(np.float32)
+_DCT = scipy.fft.dct(np.eye(_MEL_FB.shape[0]), type=2, norm="ortho", axis=0)[:N_MFCC].astype(np.float32)
+
+# FFTW plan over a small fixed block of frames, so short clips don't pay for a
+# 30s transform. FFTW_ESTIMATE keeps planning cheap in every pool worker, and one
+# thread is enough since the pool already runs one process per core.
+# Plans own their input/output buffers and numpy/FFTW release the GIL, so each
+# thread gets its own plan (the thread-executor fallback in server.py runs
+# analyses concurrently in one process).
+_fft_plans = threading.local()
+
+def _fft_plan():
+    plan = getattr(_fft_plans, "plan", None)
+    if plan is None:
+        plan = _fft_plans.plan = pyfftw.builders.rfft(
+            pyfftw.empty_aligned((FFT_BLOCK_FRAMES, N_FFT), dtype='float32'),
+            axis=1, threads=1, planner_effort='FFTW_ESTIMATE'
+        )
+    return plan
+
+def _magnitude_spectrogram(frames):
+    """|rfft| of Hann-windowed float32 frames along axis 1, through an FFTW plan when available"""
+    if pyfftw is None:
+        # scipy's rfft keeps float32 input in complex64 where numpy would upcast
+        return np.abs(scipy.fft.rfft(frames * _WINDOW, axis=1))
+
+    # Window straight into the plan's input buffer instead of a separate frames-sized copy
+    fft = _fft_plan()
+    S = np.empty((len(frames), N_FFT // 2 + 1), dtype=np.float32)
+    for start in range(0, len(frames), FFT_BLOCK_FRAMES):
+        block = frames[start:start + FFT_BLOCK_FRAMES]
+        np.multiply(block, _WINDOW, out=fft.input_array[:len(block)])
+        np.abs(fft()[:len(block)], out=S[start:start + len(block)])
+    return S
+
+# Repair suggestions per damage type, built once at import; read-only mappings and
+# tuples so no caller can mutate the shared constants
+_SUGGESTIONS = MappingProxyType({
+    "engine_knock": MappingProxyType({
+        "temporary": (
+            "Use higher octane fuel",
+            "Check and replace spark plugs",
+            "Ensure proper engine oil level"
+        ),
+        "permanent": (
+            "Engine timing adjustment",
+            "Carbon cleaning service",
+            "Replace worn engine components",
+            "Professional engine diagnostic"
+        )
+    }),
+    "brake_squeal": MappingProxyType({
+        "temporary": (
+            "Clean brake rotors and pads",
+            "Check brake fluid level",
+            "Avoid hard braking when possible"
+        ),
+        "permanent": (
+            "Replace brake pads",
+            "Resurface or replace brake rotors",
+            "Brake system inspection",
+            "Replace brake hardware"
+        )
+    }),
+    "transmission_grinding": MappingProxyType({
+        "temporary": (
+            "Check transmission fluid level",
+            "Avoid aggressive shifting",
+            "Let transmission warm up"
+        ),
+        "permanent": (
+            "Transmission fluid change",
+            "Replace clutch (manual)",
+            "Transmission rebuild",
+            "Professional transmission service"
+        )
+    }),
+    "exhaust_leak": MappingProxyType({
+        "temporary": (
+            "Use exhaust paste for small leaks",
+            "Avoid high RPM driving",
+            "Check exhaust system regularly"
+        ),
+        "permanent": (
+            "Replace damaged exhaust components",
+            "Weld exhaust system repairs",
+            "Complete exhaust system inspection",
+            "Replace exhaust gaskets"
+        )
+    }),
+    "belt_squeal": MappingProxyType({
+        "temporary": (
+            "Check belt tension",
+            "Clean belt and pulleys",
+            "Use belt dressing spray"
+        ),
+        "permanent": (
+            "Replace worn belts",
+            "Replace belt tensioner",
+            "Pulley alignment check",
+            "Replace damaged pulleys"
+        )
+    }),
+    "normal_operation": MappingProxyType({
+        "temporary": (
+            "Continue regular maintenance",
+            "Monitor for any changes"
+        ),
+        "permanent": (
+            "Follow manufacturer's maintenance schedule",
+            "Regular inspections"
+        )
+    })
+})
+
+_DEFAULT_SUGGESTION = MappingProxyType({
+    "temporary": ("Consult a professional mechanic",),
+    "permanent": ("Complete diagnostic by certified technician",)
+})
+
+# Labels the rule-based classifier can produce
+DAMAGE_CATEGORIES = (
+    "engine_knock", "brake_squeal", "transmission_grinding",
+    "exhaust_leak", "belt_squeal", "normal_operation"
+)
+
+def decode_with_ffmpeg(source):
+    """Decode any ffmpeg-supported container to 16kHz mono float32 samples"""
+    # ffmpeg downmixes and resamples while decoding, so this path skips librosa.resample
+    segment = AudioSegment.from_file(source).set_channels(1).set_frame_rate(SAMPLE_RATE)
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    samples *= 1.0 / (1 << (8 * segment.sample_width - 1))
+    return samples, SAMPLE_RATE
+
+def decode_audio(audio_data: bytes):
+    """Decode uploaded bytes to 16kHz mono float32 samples, returns (samples, sample rate)"""
+    # Decode straight from memory (no temp file round-trip)
+    source = io.BytesIO(audio_data)
+    try:
+        # Fast path: WAV/FLAC/OGG straight to float32 via libsndfile
+        data, sr = sf.read(source, dtype='float32', always_2d=False)
+    except RuntimeError:
+        # sf.LibsndfileError: containers libsndfile can't read (webm/opus from
+        # MediaRecorder, m4a/aac, ...) go through pydub/ffmpeg instead
+        source.seek(0)
+        return decode_with_ffmpeg(source)
+
+    # Downmix to mono and resample to 16kHz only when needed
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if sr != SAMPLE_RATE:
+        data = librosa.resample(data, orig_sr=sr, target_sr=SAMPLE_RATE, res_type='soxr_hq')
+    return data, SAMPLE_RATE
+
+def analyze_audio(audio_data: bytes) -> Dict[str, Any]:
+    """Analyze automobile sound for damage detection"""
+    try:
+        y, sr = decode_audio(audio_data)
+
+        # Extract audio features for analysis
+        features = extract_features(y, sr)
+
+        # Mock damage classification (in real app, this would use trained model)
+        damage_type, confidence = classify_damage(features)
+
+        # Generate repair suggestions
+        repair_suggestions = get_repair_suggestions(damage_type)
+
+        return {
+            "damage_type": damage_type,
+            "confidence": confidence,
+            "features": features,
+            "repair_suggestions": repair_suggestions
+        }
+    except Exception as e:
+        logging.error(f"Audio analysis error: {e}")
+        return {
+            "damage_type": "analysis_failed",
+            "confidence": 0.0,
+            "features": {},
+            "repair_suggestions": {"temporary": [], "permanent": []}
+        }
+
+def extract_features(audio, sr):
+    """Extract relevant audio features"""
+    if len(audio) == 0:
+        # Nothing to measure; an all-zero spectrum would otherwise classify as healthy
+        logging.error("Feature extraction error: empty audio")
+        return {}
+
+    try:
+        # Frame the signal once (librosa defaults: centered, n_fft=2048, hop=512)
+        padded = np.pad(np.asarray(audio, dtype=np.float32), N_FFT // 2)
+        frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+
+        # Shared magnitude spectrogram (frames x bins) for every spectral feature
+        S = _magnitude_spectrogram(frames)
+        freqs = _FREQS if sr == SAMPLE_RATE else np.fft.rfftfreq(N_FFT, d=1.0 / sr).astype(np.float32)
+        mel_fb = _MEL_FB if sr == SAMPLE_RATE else librosa.filters.mel(sr=sr, n_fft=N_FFT)
+
+        # MFCCs from the same spectrogram: mel power -> dB -> DCT-II
+        log_mel = librosa.power_to_db(np.square(S) @ mel_fb.T)
+        mfccs = np.ascontiguousarray(log_mel @ _DCT.T, dtype=np.float32)
+
+        # Frequency-weighted sum per frame for the centroid, taken before S is reused below
+        weighted = S @ freqs
+
+        # Spectral rolloff: first bin holding 85% of the frame's energy.
+        # The running sum overwrites S in place; its last column is the frame magnitude.
+        cumulative = np.cumsum(S, axis=1, out=S)
+        magnitude = cumulative[:, -1].copy()
+        rolloff_bins = (cumulative < 0.85 * magnitude[:, None]).sum(axis=1)
+        spectral_rolloff = freqs[np.minimum(rolloff_bins, len(freqs) - 1)]
+
+        # Spectral centroid per frame; silent frames map to 0 like librosa
+        spectral_centroid = np.divide(weighted, magnitude, out=np.zeros_like(weighted), where=magnitude > 0)
+
+        # Zero crossing rate over the raw signal: sign flips between neighbouring samples,
+        # no per-frame (1, n_frames) array as with librosa.feature.zero_crossing_rate
+        zero_crossing_rate = np.count_nonzero(np.diff(np.signbit(audio))) / len(audio)
+
+        # MFCC mean/std from first and second moments in one pass over the matrix
+        # (accumulated in float64: E[x^2] - E[x]^2 cancels badly in float32)
+        n_frames = mfccs.shape[0]
+        mfcc_mean = mfccs.sum(axis=0, dtype=np.float64) / n_frames
+        mfcc_sq_mean = np.einsum("ij,ij->j", mfccs, mfccs, dtype=np.float64) / n_frames
+        mfcc_std = np.sqrt(np.maximum(mfcc_sq_mean - mfcc_mean * mfcc_mean, 0.0))
+
+        # Compute statistics
+        features = {
+            "mfcc_mean": mfcc_mean.tolist(),
+            "mfcc_std": mfcc_std.tolist(),
+            "spectral_centroid_mean": float(np.mean(spectral_centroid)),
+            "spectral_rolloff_mean": float(np.mean(spectral_rolloff)),
+            "zero_crossing_rate_mean": float(zero_crossing_rate),
+            "duration": len(audio) / sr,
+            "sample_rate": sr
+        }
+
+        return features
+    except Exception as e:
+        logging.error(f"Feature extraction error: {e}")
+        return {}
+
+def classify_damage(features):
+    """Mock damage classification based on features"""
+    # Simple rule-based classification for demo
+    if not features:
+        return "unknown", 0.0
+
+    # Mock classification logic
+    mfcc_mean = features.get("mfcc_mean", [0])
+    spectral_centroid = features.get("spectral_centroid_mean", 0)
+
+    if spectral_centroid > 2000:
+        if np.mean(mfcc_mean[:3]) > 0:
+            return "brake_squeal", 0.85
+        else:
+            return "belt_squeal", 0.78
+    elif spectral_centroid > 1000:
+        if features.get("zero_crossing_rate_mean", 0) > 0.1:
+            return "engine_knock", 0.82
+        else:
+            return "transmission_grinding", 0.75
+    elif spectral_centroid > 500:
+        return "exhaust_leak", 0.72
+    else:
+        return "normal_operation", 0.90
+
+def get_repair_suggestions(damage_type):
+    """Get repair suggestions based on damage type"""
+    # Fresh top-level dict: results are pickled back from the pool (mappingproxy
+    # can't be) and cached, so they must not alias the module constant
+    return dict(_SUGGESTIONS.get(damage_type, _DEFAULT_SUGGESTION))
+
+def warm_up():
+    """Pool initializer: run the feature path once so the FFT plan and librosa's lazy imports are ready"""
+    extract_features(np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE)
@@ -0,0 +1,38 @@
+"""Export the Wav2Vec2 classifier to ONNX for the server's ONNX Runtime session.
+
+Run once at install/build time, from the backend directory:
+
+    python export_onnx.py [output_path]
+
+The output defaults to ONNX_MODEL_PATH, or model.onnx next to server.py.
+"""
+import os
+import sys
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForAudioClassification
+
+ROOT_DIR = Path(__file__).parent
+MODEL_NAME = "facebook/wav2vec2-base-960h"
+
+
+def export_onnx(output_path: Path):
+    """Export the FP32 classifier with dynamic batch and sample axes"""
+    model = AutoModelForAudioClassification.from_pretrained(MODEL_NAME, torchscript=True).eval()
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 16000),
+        str(output_path),
+        input_names=["input_values"],
+        output_names=["logits"],
+        dynamic_axes={"input_values": {0: "batch", 1: "samples"}, "logits": {0: "batch"}},
+        opset_version=14
+    )
+
+
+if __name__ == "__main__":
+    default_path = os.environ.get('ONNX_MODEL_PATH', ROOT_DIR / 'model.onnx')
+    output_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(default_path)
+    export_onnx(output_path)
+    print(f"Exported {MODEL_NAME} to {output_path}")
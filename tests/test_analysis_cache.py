@@ -0,0 +1,80 @@
+"""Content-hash reuse of analysis results in the /analyze-audio route"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+for module in ("numpy", "scipy", "librosa", "soundfile", "pydub", "fastapi", "multipart", "motor", "dotenv", "pydantic"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import server  # noqa: E402
+
+
+class FakeCollection:
+    def __init__(self, document=None):
+        self.document = document
+        self.queries = []
+
+    async def find_one(self, query, projection=None):
+        self.queries.append(query)
+        return self.document
+
+
+class FakeDatabase:
+    def __init__(self, document=None):
+        self.audio_analyses = FakeCollection(document)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(server, "_analysis_cache", type(server._analysis_cache)())
+
+
+def test_cache_hit_skips_mongo(monkeypatch):
+    fake_db = FakeDatabase()
+    monkeypatch.setattr(server, "db", fake_db)
+    result = {"damage_type": "brake_squeal", "confidence": 0.85}
+    server._cache_analysis("abc", result)
+
+    assert asyncio.run(server._find_cached_analysis("abc")) is result
+    assert fake_db.audio_analyses.queries == []
+
+
+def test_cache_miss_falls_back_to_mongo_and_caches(monkeypatch):
+    document = {"damage_type": "exhaust_leak", "confidence": 0.72}
+    fake_db = FakeDatabase(document)
+    monkeypatch.setattr(server, "db", fake_db)
+
+    assert asyncio.run(server._find_cached_analysis("abc")) == document
+    assert server._analysis_cache["abc"] == document
+
+    # Failed and unknown results are never reused from Mongo
+    (query,) = fake_db.audio_analyses.queries
+    assert query["content_hash"] == "abc"
+    assert set(query["damage_type"]["$nin"]) == {"analysis_failed", "unknown"}
+
+
+def test_cache_miss_without_document_returns_none(monkeypatch):
+    monkeypatch.setattr(server, "db", FakeDatabase())
+
+    assert asyncio.run(server._find_cached_analysis("abc")) is None
+    assert "abc" not in server._analysis_cache
+
+
+def test_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(server, "db", FakeDatabase())
+    monkeypatch.setattr(server, "ANALYSIS_CACHE_SIZE", 2)
+
+    server._cache_analysis("a", {"damage_type": "a"})
+    server._cache_analysis("b", {"damage_type": "b"})
+    asyncio.run(server._find_cached_analysis("a"))  # touch "a" so "b" is the oldest
+    server._cache_analysis("c", {"damage_type": "c"})
+
+    assert list(server._analysis_cache) == ["a", "c"]
+
+
+def test_failed_and_unknown_results_are_not_cacheable():
+    assert "analysis_failed" in server.UNCACHEABLE_DAMAGE_TYPES
+    assert "unknown" in server.UNCACHEABLE_DAMAGE_TYPES
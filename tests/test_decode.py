@@ -0,0 +1,80 @@
+"""Decoding of uploads: libsndfile fast path and the pydub/ffmpeg fallback"""
+import io
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+sf = pytest.importorskip("soundfile")
+pytest.importorskip("librosa")
+pytest.importorskip("scipy")
+pytest.importorskip("pydub")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import audio_analysis  # noqa: E402
+
+SR = audio_analysis.SAMPLE_RATE
+
+
+def make_wav(duration=1.0, sample_rate=44100, channels=2, frequency=440.0):
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    tone = 0.5 * np.sin(2 * np.pi * frequency * t)
+    data = np.stack([tone] * channels, axis=1) if channels > 1 else tone
+    buffer = io.BytesIO()
+    sf.write(buffer, data, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def test_decode_fast_path_downmixes_and_resamples():
+    y, sr = audio_analysis.decode_audio(make_wav())
+
+    assert sr == SR
+    assert y.ndim == 1
+    assert y.dtype == np.float32
+    assert len(y) == pytest.approx(SR, abs=16)
+    assert np.abs(y).max() == pytest.approx(0.5, abs=0.02)
+
+
+def test_decode_falls_back_when_libsndfile_fails(monkeypatch):
+    calls = []
+
+    def failing_read(*args, **kwargs):
+        raise RuntimeError("Format not recognised")
+
+    def fake_ffmpeg(source):
+        calls.append(source.read())
+        return np.zeros(SR, dtype=np.float32), SR
+
+    monkeypatch.setattr(audio_analysis.sf, "read", failing_read)
+    monkeypatch.setattr(audio_analysis, "decode_with_ffmpeg", fake_ffmpeg)
+
+    audio_data = make_wav()
+    y, sr = audio_analysis.decode_audio(audio_data)
+
+    # The fallback gets the whole upload, rewound after libsndfile's attempt
+    assert calls == [audio_data]
+    assert (len(y), sr) == (SR, SR)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_decode_with_ffmpeg_returns_16k_mono_float32():
+    y, sr = audio_analysis.decode_with_ffmpeg(io.BytesIO(make_wav()))
+
+    assert sr == SR
+    assert y.ndim == 1
+    assert y.dtype == np.float32
+    assert len(y) == pytest.approx(SR, abs=16)
+    assert np.abs(y).max() == pytest.approx(0.5, abs=0.02)
+
+
+def test_analyze_audio_empty_wav_is_unknown():
+    # An empty but valid WAV decodes to zero samples and must not classify as healthy
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(0, dtype=np.float32), SR, format="WAV")
+    result = audio_analysis.analyze_audio(buffer.getvalue())
+
+    assert result["damage_type"] == "unknown"
+    assert result["confidence"] == 0.0
+    assert result["features"] == {}
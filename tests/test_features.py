@@ -0,0 +1,72 @@
+"""Pin AudioAnalyzer.extract_features against the librosa features it replaces"""
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+librosa = pytest.importorskip("librosa")
+pytest.importorskip("scipy")
+pytest.importorskip("soundfile")
+pytest.importorskip("pydub")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import audio_analysis  # noqa: E402
+
+SR = audio_analysis.SAMPLE_RATE
+
+
+def make_tone(duration=3.0, frequency=440.0):
+    t = np.arange(int(SR * duration)) / SR
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def make_noise(duration=3.0):
+    rng = np.random.default_rng(0)
+    return (0.1 * rng.standard_normal(int(SR * duration))).astype(np.float32)
+
+
+@pytest.mark.parametrize("audio", [make_tone(), make_noise()], ids=["tone", "noise"])
+def test_extract_features_matches_librosa(audio):
+    features = audio_analysis.extract_features(audio, SR)
+
+    mfccs = librosa.feature.mfcc(y=audio, sr=SR, n_mfcc=13)
+    np.testing.assert_allclose(features["mfcc_mean"], mfccs.mean(axis=1), rtol=1e-4, atol=1e-3)
+    np.testing.assert_allclose(features["mfcc_std"], mfccs.std(axis=1), rtol=1e-4, atol=1e-3)
+
+    centroid = librosa.feature.spectral_centroid(y=audio, sr=SR)
+    assert features["spectral_centroid_mean"] == pytest.approx(float(centroid.mean()), abs=1.0)
+
+    # Rolloff snaps to FFT bins (~7.8Hz), so allow a bin flip in a frame or two
+    rolloff = librosa.feature.spectral_rolloff(y=audio, sr=SR)
+    assert features["spectral_rolloff_mean"] == pytest.approx(float(rolloff.mean()), abs=1.0)
+
+    # Global crossing rate vs librosa's framewise mean: equal up to frame-edge effects
+    zcr = librosa.feature.zero_crossing_rate(audio)
+    assert features["zero_crossing_rate_mean"] == pytest.approx(float(zcr.mean()), rel=0.05)
+
+    assert features["duration"] == pytest.approx(len(audio) / SR)
+    assert features["sample_rate"] == SR
+
+
+def test_extract_features_short_clip():
+    # 0.05s: two frames, both dominated by the centering pad
+    audio = make_tone(duration=0.05)
+    features = audio_analysis.extract_features(audio, SR)
+
+    mfccs = librosa.feature.mfcc(y=audio, sr=SR, n_mfcc=13)
+    np.testing.assert_allclose(features["mfcc_mean"], mfccs.mean(axis=1), rtol=1e-4, atol=1e-3)
+    centroid = librosa.feature.spectral_centroid(y=audio, sr=SR)
+    assert features["spectral_centroid_mean"] == pytest.approx(float(centroid.mean()), abs=1.0)
+    rolloff = librosa.feature.spectral_rolloff(y=audio, sr=SR)
+    assert features["spectral_rolloff_mean"] == pytest.approx(float(rolloff.mean()), abs=1.0)
+
+    # The global rate is not diluted by padding the way librosa's framewise mean is:
+    # a 440Hz tone crosses zero 880 times a second
+    assert features["zero_crossing_rate_mean"] == pytest.approx(880 / SR, abs=0.005)
+
+
+def test_extract_features_rejects_empty_audio():
+    # Empty decodes must not look like silence (which classifies as normal_operation)
+    assert audio_analysis.extract_features(np.zeros(0, dtype=np.float32), SR) == {}
+    assert audio_analysis.classify_damage({}) == ("unknown", 0.0)